@@ -1,12 +1,22 @@
 import json
-import time
 import os
 import argparse
+import asyncio
+import functools
+import types
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, List, Set
-import threading
+from typing import Dict, Any, FrozenSet, List, Mapping, Optional, Set, Tuple
+import aiohttp
 import cloudscraper
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import csv as pacsv
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from urllib3.util.retry import Retry
 from pathlib import Path
 
 # --- CORRECT, SIMPLE API CODES ---
@@ -15,23 +25,33 @@ CITY_CODES = {
     "itanhaem-sp": "109237",
 }
 
+# Used for the cookie warm-up and mirrored by scrape_page's retry loop. POST is retried too: the postings search
+# has no side effects. 503 is left out because that is how Cloudflare serves its challenge, which must not be retried blindly.
+HTTP_RETRY = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 502, 504], allowed_methods=frozenset(["GET", "POST"]))
+
+# Only the last page matters for resuming, so the state file is rewritten every few pages and once at the end.
+STATE_SAVE_INTERVAL = 5
+
 class ImovelWebScraper:
-    def __init__(self, city_code: str, city_slug: str, seen_posting_ids: Set[str], base_state_file_name: str = "scraper_state", cookies_file: str = "cookies.json"):
+    def __init__(self, city_code: str, city_slug: str, seen_posting_ids: Set[str], base_state_file_name: str = "scraper_state", cookies_file: str = "cookies.json", concurrency: int = 4):
         self.city_slug = city_slug
         self.city_code = city_code
         self.seen_posting_ids = seen_posting_ids
+        # Known ids plus everything found this session, so each listing costs one set lookup instead of two.
+        self._seen_total = set(seen_posting_ids)
         self.state_file = f"{base_state_file_name}_{self.city_slug.replace('-', '_')}.json"
         self.cookies_file = cookies_file
-        
-        self.session = cloudscraper.create_scraper()
-        
+        self.concurrency = max(1, concurrency)
+
+        # The aiohttp session is opened in scrape(), after Cloudflare cookies are warmed.
+        self.session: aiohttp.ClientSession = None
+
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:140.0) Gecko/20100101 Firefox/140.0",
-            "Accept": "*/*", "Accept-Language": "pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3",
+            "Accept": "*/*", "Accept-Encoding": DEFAULT_ACCEPT_ENCODING, "Accept-Language": "pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3",
             "Content-Type": "application/json", "X-Requested-With": "XMLHttpRequest",
             "Origin": "https://www.imovelweb.com.br", "Connection": "keep-alive",
         }
-        self.session.headers.update(self.headers)
 
         self.url = "https://www.imovelweb.com.br/rplis-api/postings"
         self.params = {"dynamicListingSearch": "true", "enableStepSA": "true"}
@@ -57,160 +77,336 @@ class ImovelWebScraper:
             "subZone": None, "coordenates": None
         }
 
+        # --- FINAL PAYLOAD LOGIC ---
+        # Built once per city; scrape_page only rewrites the page number before encoding.
+        self._payload = dict(self.base_payload)
+        self._payload['city'] = self.city_code # Use the correct integer code
+        self._payload['province'] = None      # CRITICAL: Ensure province is None
+        self._referer_fmt = f"https://www.imovelweb.com.br/imoveis-aluguel-{self.city_slug}-%d.html"
+
         self.new_listings_this_session = {}
         self.state = self._load_state()
-        self._load_cookies()
         self.new_listings_count = 0
 
     def _load_state(self) -> Dict[str, Any]:
         if os.path.exists(self.state_file):
             try:
-                with open(self.state_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except json.JSONDecodeError: return {"last_page": 0}
+                return orjson.loads(Path(self.state_file).read_bytes())
+            except orjson.JSONDecodeError: return {"last_page": 0}
         return {"last_page": 0}
 
     def _save_state(self, page: int) -> None:
         self.state["last_page"] = page
-        with open(self.state_file, 'w', encoding='utf-8') as f:
-            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        # Write-then-rename so a crash mid-write never leaves a torn state file behind. This only runs every
+        # STATE_SAVE_INTERVAL pages, so the fsync that makes the new contents survive a power loss is affordable.
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(orjson.dumps(self.state))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_file)
 
-    def _load_cookies(self) -> None:
+    def _load_cookies(self, scraper: cloudscraper.CloudScraper) -> None:
         if os.path.exists(self.cookies_file):
             try:
                 with open(self.cookies_file, 'r', encoding='utf-8') as f:
-                    self.session.cookies.update(json.load(f))
+                    scraper.cookies.update(json.load(f))
             except json.JSONDecodeError: print(f"Error loading cookies from {self.cookies_file}.")
 
-    def scrape_page(self, page: int) -> bool:
+    def _warm_cookies(self) -> Dict[str, str]:
+        """Makes one blocking cloudscraper request to obtain the Cloudflare cookies for the aiohttp session."""
+        scraper = cloudscraper.create_scraper()
+        # Keep cloudscraper's CipherSuiteAdapter (its TLS fingerprint is what gets past Cloudflare); only add retries.
+        scraper.adapters['https://'].max_retries = HTTP_RETRY
+        scraper.headers.update(self.headers)
+        self._load_cookies(scraper)
         try:
-            self.session.headers["Referer"] = f"https://www.imovelweb.com.br/imoveis-aluguel-{self.city_slug}-{page}.html"
-            
-            # --- FINAL PAYLOAD LOGIC ---
-            request_payload = self.base_payload.copy()
-            request_payload['city'] = self.city_code # Use the correct integer code
-            request_payload['province'] = None      # CRITICAL: Ensure province is None
-            request_payload['pagina'] = page        # Use the correct pagination key
-
-            print(f"Requesting page {page} for city {self.city_slug}...")
-            response = self.session.post(self.url, params=self.params, json=request_payload, timeout=45)
-
-            if response.status_code == 200:
-                data = response.json()
-                listings_on_page = data.get("listPostings", [])
-                if not listings_on_page:
-                    print(f"Page {page} ({self.city_slug}): No more listings found.")
-                    return False
-
-                new_in_session_count = 0
-                for listing_item in listings_on_page:
-                    posting_id = str(listing_item.get("postingId"))
-                    if posting_id and posting_id not in self.seen_posting_ids and posting_id not in self.new_listings_this_session:
-                        self.new_listings_this_session[posting_id] = listing_item
-                        new_in_session_count += 1
-                
-                self.new_listings_count += new_in_session_count
-                print(f"Page {page} ({self.city_slug}): Found {len(listings_on_page)} listings, {new_in_session_count} are new.")
-                self._save_state(page)
-                return True
-            else:
-                print(f"Error: Status code {response.status_code} for page {page}. Response: {response.text[:200]}")
-                return False
+            scraper.post(self.url, params=self.params, data=orjson.dumps(self._payload), timeout=45)
+            return self._cookie_dict(scraper)
+        except Exception as e:
+            print(f"Warning: Cookie warm-up request failed for {self.city_slug}: {e}")
+            return self._cookie_dict(scraper)
+
+    @staticmethod
+    def _cookie_dict(scraper: cloudscraper.CloudScraper) -> Dict[str, str]:
+        # cookies.json entries carry no domain, and the warm-up sets some again (e.g. __cf_bm) on .imovelweb.com.br,
+        # so one name can appear twice; dict(jar) would raise CookieConflictError. Domain-scoped (fresh) cookies win.
+        return {c.name: c.value for c in sorted(scraper.cookies, key=lambda c: bool(c.domain))}
+
+    async def scrape_page(self, page: int) -> bool:
+        try:
+            # The Referer is passed per request because several pages share the session concurrently.
+            headers = {"Referer": self._referer_fmt % page}
+            self._payload['pagina'] = page # Use the correct pagination key
+            body = orjson.dumps(self._payload) # Encoded before any await, so concurrent pages can't interleave
+
+            for attempt in range(HTTP_RETRY.total + 1):
+                if attempt:
+                    # Back off like HTTP_RETRY, then wait for a paced slot so retries don't raise the request rate.
+                    await asyncio.sleep(HTTP_RETRY.backoff_factor * 2 ** (attempt - 1))
+                    await self._wait_for_turn()
+                print(f"Requesting page {page} for city {self.city_slug}...")
+                try:
+                    async with self.session.post(self.url, params=self.params, data=body, headers=headers,
+                                                 timeout=aiohttp.ClientTimeout(total=45)) as response:
+                        if response.status in HTTP_RETRY.status_forcelist and attempt < HTTP_RETRY.total:
+                            print(f"Page {page} ({self.city_slug}): Status code {response.status}, retrying ({attempt + 1}/{HTTP_RETRY.total}).")
+                            continue
+                        if response.status == 200:
+                            data = orjson.loads(await response.read())
+                            listings_on_page = data.get("listPostings", [])
+                            if not listings_on_page:
+                                print(f"Page {page} ({self.city_slug}): No more listings found.")
+                                return False
+
+                            new_in_session_count = 0
+                            for listing_item in listings_on_page:
+                                posting_id = str(listing_item.get("postingId"))
+                                # Plain set lookup on purpose: a pure-Python Bloom prefilter (pybloom_live) measured ~60x slower per check.
+                                if posting_id and posting_id not in self._seen_total:
+                                    self._seen_total.add(posting_id)
+                                    self.new_listings_this_session[posting_id] = listing_item
+                                    new_in_session_count += 1
+
+                            self.new_listings_count += new_in_session_count
+                            print(f"Page {page} ({self.city_slug}): Found {len(listings_on_page)} listings, {new_in_session_count} are new.")
+                            return True
+                        else:
+                            text = await response.text()
+                            print(f"Error: Status code {response.status} for page {page}. Response: {text[:200]}")
+                            return False
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == HTTP_RETRY.total: raise
+                    print(f"Page {page} ({self.city_slug}): {e!r}, retrying ({attempt + 1}/{HTTP_RETRY.total}).")
+            return False
         except Exception as e:
             print(f"An unexpected error occurred on page {page}: {e}")
             return False
 
-    def scrape(self, start_page: int = None, delay: float = 5.0, max_pages: int = None) -> Dict[str, Any]:
+    async def _wait_for_turn(self) -> None:
+        # Starts stay `delay` apart, so the per-host request rate never exceeds the sequential scraper's;
+        # the win comes from overlapping each response's latency with the next request.
+        async with self._pace_lock:
+            loop = asyncio.get_running_loop()
+            await asyncio.sleep(max(0.0, self._next_start - loop.time()))
+            self._next_start = loop.time() + self._delay
+
+    async def _bounded_fetch(self, page: int) -> bool:
+        """Fetches one page, holding a concurrency slot and starting at least `delay` seconds after the previous request."""
+        async with self._semaphore:
+            await self._wait_for_turn()
+            return await self.scrape_page(page)
+
+    async def scrape(self, start_page: int = None, delay: float = 5.0, max_pages: int = None) -> Dict[str, Any]:
         current_page = start_page or self.state.get("last_page", 0) + 1
         print(f"Starting scraper for '{self.city_slug}' at page {current_page}. Known listings for this city: {len(self.seen_posting_ids)}")
-        
+
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._pace_lock = asyncio.Lock()
+        self._delay = delay
+        self._next_start = 0.0
+        cookies = await asyncio.to_thread(self._warm_cookies)
+        # Pages share keep-alive connections; only `concurrency` of them ever hit the host at once.
+        connector = aiohttp.TCPConnector(limit=32, limit_per_host=self.concurrency)
+
         pages_scraped_this_run = 0
         try:
-            while True:
-                if max_pages and pages_scraped_this_run >= max_pages:
-                    print(f"Reached max pages ({max_pages}) for {self.city_slug}.")
-                    break
-                if not self.scrape_page(current_page): break
-                
-                pages_scraped_this_run += 1
-                current_page += 1
-                time.sleep(delay)
+            async with aiohttp.ClientSession(headers=self.headers, cookies=cookies, connector=connector) as self.session:
+                while True:
+                    window = self.concurrency
+                    if max_pages:
+                        if pages_scraped_this_run >= max_pages:
+                            print(f"Reached max pages ({max_pages}) for {self.city_slug}.")
+                            break
+                        window = min(window, max_pages - pages_scraped_this_run)
+
+                    pages = range(current_page, current_page + window)
+                    results = await asyncio.gather(*[self._bounded_fetch(p) for p in pages])
+
+                    # Only the leading run of successful pages counts; resume right after it.
+                    for page, ok in zip(pages, results):
+                        if not ok: break
+                        pages_scraped_this_run += 1
+                        current_page = page + 1
+                        if page % STATE_SAVE_INTERVAL == 0: self._save_state(page)
+                    if not all(results): break
         finally:
+            if pages_scraped_this_run and self.state.get("last_page") != current_page - 1:
+                self._save_state(current_page - 1)
             print(f"Finished scraping for {self.city_slug}. Found {self.new_listings_count} new listings in this session.")
             return self.new_listings_this_session
 
-def load_seen_ids_from_city_csvs(directory: Path, city_slug: str) -> Set[str]:
-    if not directory.exists(): return set()
-    seen_ids = set()
-    city_csv_pattern = f"*_{city_slug}_results.csv"
-    csv_files = list(directory.glob(city_csv_pattern))
-    if not csv_files: return seen_ids
-    for file in csv_files:
+def _ids_sidecar_path(results_path: Path) -> Path:
+    # Strip every suffix so .parquet, .csv and .csv.gz results all map to <timestamp>_<city>_results_ids.txt.
+    return results_path.with_name(results_path.name.split('.', 1)[0] + '_ids.txt')
+
+_POSTING_ID_SCHEMA = pa.schema([('postingId', pa.string())])
+# Descriptions span several lines, so quoted newlines must be allowed or Arrow's chunker loses sync.
+_CSV_FORMAT = ds.CsvFileFormat(parse_options=pacsv.ParseOptions(newlines_in_values=True))
+
+def _scan_posting_ids(files: List[Path], file_format: str) -> Dict[str, List[str]]:
+    """Reads postingId from every file in one Arrow dataset scan and groups the ids by source file."""
+    ids_by_file: Dict[str, List[str]] = {}
+    if not files: return ids_by_file
+    dataset = ds.dataset([str(f) for f in files], format=_CSV_FORMAT if file_format == 'csv' else file_format, schema=_POSTING_ID_SCHEMA)
+    table = dataset.to_table(columns=['postingId', '__filename'])
+    for posting_id, filename in zip(table.column('postingId').to_pylist(), table.column('__filename').to_pylist()):
+        if posting_id is not None: ids_by_file.setdefault(filename, []).append(posting_id)
+    return ids_by_file
+
+def _read_posting_ids_file(file: Path, file_format: str) -> List[str]:
+    """Per-file fallback through pandas, so an Arrow parser problem can't silently drop a file's ids."""
+    if file_format == 'csv':
+        df = pd.read_csv(file, usecols=['postingId'], dtype=str, compression='infer')
+    else:
+        df = pd.read_parquet(file, columns=['postingId'])
+    return df['postingId'].dropna().astype(str).tolist()
+
+# The cached result is shared by every caller, so it is handed out read-only.
+@functools.lru_cache(maxsize=None)
+def load_seen_ids_for_cities(directory: Path, city_slugs: Tuple[str, ...]) -> Mapping[str, FrozenSet[str]]:
+    """Loads the seen posting ids of several cities with a single directory listing and one scan per results format."""
+    seen_ids: Dict[str, Set[str]] = {slug: set() for slug in city_slugs}
+    if not directory.exists(): return types.MappingProxyType({slug: frozenset() for slug in city_slugs})
+
+    file_city: Dict[str, str] = {}
+    sidecar_files, parquet_files, csv_files = [], [], []
+    for path in directory.iterdir():
+        stem = path.name.split('.', 1)[0]
+        city = next((slug for slug in city_slugs if stem.endswith((f"_{slug}_results", f"_{slug}_results_ids"))), None)
+        if city is None: continue
+        file_city[str(path)] = city
+        if path.name.endswith('_results_ids.txt'): sidecar_files.append(path)
+        elif path.name.endswith('_results.parquet'): parquet_files.append(path)
+        elif path.name.endswith(('_results.csv', '_results.csv.gz')): csv_files.append(path)
+
+    for path in sidecar_files:
+        seen_ids[file_city[str(path)]].update(path.read_text(encoding='utf-8').splitlines())
+    covered = set(sidecar_files)
+    # Only results written before the sidecars existed need a full read.
+    for files, file_format in ((parquet_files, 'parquet'), (csv_files, 'csv')):
+        files = [f for f in files if _ids_sidecar_path(f) not in covered]
         try:
-            df = pd.read_csv(file, usecols=['postingId'], dtype={'postingId': str})
-            seen_ids.update(df['postingId'].dropna().tolist())
+            ids_by_file = _scan_posting_ids(files, file_format)
         except Exception as e:
-            print(f"Warning: Could not read {file}. Error: {e}")
-    return seen_ids
+            # One unreadable file fails the whole scan; retry file by file so only that one is skipped.
+            print(f"Warning: Combined {file_format} scan failed, reading files one by one. Error: {e}")
+            ids_by_file = {}
+            for file in files:
+                try:
+                    ids_by_file[str(file)] = _read_posting_ids_file(file, file_format)
+                except Exception as e:
+                    print(f"Warning: Could not read {file}. Error: {e}")
+        for filename, ids in ids_by_file.items():
+            seen_ids[file_city[filename]].update(ids)
+    return types.MappingProxyType({slug: frozenset(ids) for slug, ids in seen_ids.items()})
+
+def load_seen_ids_from_city_csvs(directory: Path, city_slug: str) -> FrozenSet[str]:
+    return load_seen_ids_for_cities(directory, (city_slug,))[city_slug]
+
+def _column(df: pd.DataFrame, *path: Any) -> pd.Series:
+    """Returns the column at `path` (nested keys/indexes walked via .str.get), or an all-None column if absent."""
+    empty = pd.Series(None, index=df.index, dtype=object)
+    name, *rest = path
+    if name not in df.columns: return empty
+    series = df[name]
+    for key in rest:
+        try: series = series.str.get(key)
+        except AttributeError: return empty
+    return series
+
+# Checked in order; a label is assigned to the first token it contains. Tokens are ASCII-folded ('útil' -> b'util').
+_FEATURE_TOKENS = [(b'util', 'area_util'), (b'total', 'area_total'), (b'quarto', 'bedrooms'),
+                   (b'banheiro', 'bathrooms'), (b'suite', 'suites'), (b'vaga', 'parking')]
+
+@functools.lru_cache(maxsize=None)
+def _feature_name(label: str) -> Optional[str]:
+    """Maps a mainFeatures label to its field name (or None), folding and matching each distinct label only once."""
+    lbl = unicodedata.normalize('NFKD', label).encode('ascii', 'ignore').lower()
+    return next((name for tok, name in _FEATURE_TOKENS if tok in lbl), None)
+
+_FEATURE_COLUMNS = ['bedrooms', 'suites', 'bathrooms', 'parking', 'area_m2']
+
+def _parse_main_features(features_dict: Any) -> Tuple[Any, ...]:
+    """Returns the _FEATURE_COLUMNS values for one listing's mainFeatures."""
+    results = dict.fromkeys(name for _, name in _FEATURE_TOKENS)
+    if isinstance(features_dict, dict):
+        try:
+            for f in features_dict.values():
+                name = _feature_name(f.get('label',''))
+                if name: results[name] = f.get('value')
+        except (AttributeError, TypeError): pass
+    return (results['bedrooms'], results['suites'], results['bathrooms'], results['parking'],
+            results['area_util'] or results['area_total'])
+
+# Only the top-level fields the flattened output reads; nested values are walked column-wise by _column.
+_LISTING_FIELDS = ('postingId', 'priceOperationTypes', 'expenses', 'postingLocation', 'title',
+                   'descriptionNormalized', 'publisher', 'url')
 
-def save_new_listings_to_city_csv(new_listings: List[Dict[str, Any]], directory: Path, city_slug: str):
+def save_new_listings_to_city_csv(new_listings: List[Dict[str, Any]], directory: Path, city_slug: str, output_format: str = "parquet"):
     if not new_listings:
         print(f"No new listings to save for '{city_slug}'.")
         return
 
     directory.mkdir(parents=True, exist_ok=True)
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    output_path = directory / f"{timestamp}_{city_slug}_results.csv"
-    flattened_data = []
-    for listing in new_listings:
-        price, currency, expenses = None, None, None
-        try:
-            price_info = listing['priceOperationTypes'][0]['prices'][0]
-            price = price_info.get('amount'); currency = price_info.get('currency')
-        except (KeyError, TypeError, IndexError): pass
-        try: expenses = listing['expenses']['amount']
-        except (KeyError, TypeError): pass
-        bedrooms, bathrooms, area, suites, parking = None, None, None, None, None
-        try:
-            features_dict = listing.get('mainFeatures', {})
-            if isinstance(features_dict, dict):
-                area_util = next((f.get('value') for f in features_dict.values() if 'útil' in f.get('label','').lower()), None)
-                area_total = next((f.get('value') for f in features_dict.values() if 'total' in f.get('label','').lower()), None)
-                area = area_util or area_total
-                bedrooms = next((f.get('value') for f in features_dict.values() if 'quarto' in f.get('label','').lower()), None)
-                bathrooms = next((f.get('value') for f in features_dict.values() if 'banheiro' in f.get('label','').lower()), None)
-                suites = next((f.get('value') for f in features_dict.values() if 'suíte' in f.get('label','').lower()), None)
-                parking = next((f.get('value') for f in features_dict.values() if 'vaga' in f.get('label','').lower()), None)
-        except (AttributeError, TypeError): pass
-        location, latitude, longitude = None, None, None
-        try:
-            location = listing['postingLocation']['location']['name']
-            geo = listing['postingLocation']['postingGeolocation']['geolocation']
-            latitude, longitude = geo.get('latitude'), geo.get('longitude')
-        except (KeyError, TypeError, IndexError): pass
-        full_url = None
+    output_stem = f"{timestamp}_{city_slug}_results"
+
+    df = pd.DataFrame([{key: listing.get(key) for key in _LISTING_FIELDS} for listing in new_listings], columns=list(_LISTING_FIELDS))
+    # Feature values arrive as either strings or numbers ("60" vs 70); one string type keeps Parquet writable.
+    features = pd.DataFrame([_parse_main_features(listing.get('mainFeatures')) for listing in new_listings],
+                            columns=_FEATURE_COLUMNS, index=df.index).astype('string')
+    relative_url = _column(df, 'url').fillna('')
+    flattened = pd.DataFrame({
+        'postingId': _column(df, 'postingId').astype('string'),
+        'price': _column(df, 'priceOperationTypes', 0, 'prices', 0, 'amount'),
+        'expenses': _column(df, 'expenses', 'amount'),
+        'currency': _column(df, 'priceOperationTypes', 0, 'prices', 0, 'currency'),
+        'bedrooms': features['bedrooms'], 'suites': features['suites'], 'bathrooms': features['bathrooms'],
+        'parking': features['parking'], 'area_m2': features['area_m2'],
+        'location': _column(df, 'postingLocation', 'location', 'name'),
+        'latitude': _column(df, 'postingLocation', 'postingGeolocation', 'geolocation', 'latitude'),
+        'longitude': _column(df, 'postingLocation', 'postingGeolocation', 'geolocation', 'longitude'),
+        'title': _column(df, 'title'),
+        'description': _column(df, 'descriptionNormalized'),
+        'publisher': _column(df, 'publisher', 'name'),
+        'full_url': ("https://www.imovelweb.com.br" + relative_url.astype(str)).where(relative_url != ''),
+        'retrievedDate': timestamp,
+    })
+
+    output_path = None
+    if output_format != "csv":
         try:
-            base_url = "https://www.imovelweb.com.br"
-            relative_url = listing.get('url', '')
-            if relative_url: full_url = base_url + relative_url
-        except TypeError: pass
-        flat_item = {'postingId': listing.get('postingId'),'price': price, 'expenses': expenses, 'currency': currency, 'bedrooms': bedrooms, 'suites': suites, 'bathrooms': bathrooms, 'parking': parking, 'area_m2': area, 'location': location, 'latitude': latitude, 'longitude': longitude, 'title': listing.get('title'), 'description': listing.get('descriptionNormalized'),'publisher': listing.get('publisher', {}).get('name'), 'full_url': full_url,'retrievedDate': timestamp}
-        flattened_data.append(flat_item)
-
-    df = pd.DataFrame(flattened_data)
-    df.to_csv(output_path, index=False, encoding='utf-8-sig')
+            output_path = directory / f"{output_stem}.parquet"
+            flattened.to_parquet(output_path, index=False, compression='zstd')
+        except pa.ArrowException as e:
+            # last_page is already saved, so a failed write would lose these listings for good; CSV accepts any values.
+            print(f"Warning: Could not write Parquet for '{city_slug}', falling back to CSV. Error: {e}")
+            output_path.unlink(missing_ok=True)
+            output_path = None
+    if output_path is None:
+        output_path = directory / f"{output_stem}.csv.gz"
+        flattened.to_csv(output_path, index=False, encoding='utf-8', compression={'method': 'gzip', 'compresslevel': 1})
+    _ids_sidecar_path(output_path).write_text('\n'.join(flattened['postingId'].dropna()), encoding='utf-8')
+    # Only clears this process's cache, for in-process callers that load again after a write; main loads once
+    # before the workers start and each worker is its own process, so this never updates anyone else's ids.
+    load_seen_ids_for_cities.cache_clear()
     print(f"Success! Saved {len(new_listings)} new listings for '{city_slug}' to: {output_path}")
 
-def scrape_city_task(city_slug: str, city_code: str, output_dir: Path, args: argparse.Namespace):
-    """A self-contained task for a single thread to scrape and save one city."""
-    seen_ids = load_seen_ids_from_city_csvs(output_dir, city_slug)
+async def scrape_city_task(city_slug: str, city_code: str, seen_ids: FrozenSet[str], output_dir: Path, args: argparse.Namespace, start_delay: float = 0.0):
+    """A self-contained task to scrape and save one city."""
+    await asyncio.sleep(start_delay)
     scraper = ImovelWebScraper(
         city_slug=city_slug, city_code=city_code, seen_posting_ids=seen_ids,
-        base_state_file_name=args.state_base_name, cookies_file=args.cookies
+        base_state_file_name=args.state_base_name, cookies_file=args.cookies, concurrency=args.concurrency
     )
-    new_city_listings = scraper.scrape(start_page=args.start, delay=args.delay, max_pages=args.max_pages)
+    new_city_listings = await scraper.scrape(start_page=args.start, delay=args.delay, max_pages=args.max_pages)
     if new_city_listings:
-        save_new_listings_to_city_csv(list(new_city_listings.values()), output_dir, city_slug)
+        save_new_listings_to_city_csv(list(new_city_listings.values()), output_dir, city_slug, output_format=args.format)
+
+def run_city_process(city_slug: str, city_code: str, seen_ids: FrozenSet[str], output_dir: Path, args: argparse.Namespace, start_delay: float = 0.0):
+    """Process entry point: runs one city's scrape on its own event loop, so flattening isn't shared under one GIL."""
+    asyncio.run(scrape_city_task(city_slug, city_code, seen_ids, output_dir, args, start_delay=start_delay))
 
 def main():
     parser = argparse.ArgumentParser(description="Scrape new property listings from imovelweb.com.br.")
@@ -218,23 +414,27 @@ def main():
     parser.add_argument("--start", type=int, help="Starting page number (overrides saved state for all cities)")
     parser.add_argument("--state-base-name", default="scraper_state", help="Base name for city-specific state files")
     parser.add_argument("--cookies", default="cookies.json", help="Shared cookies file for initial load")
-    parser.add_argument("--delay", type=float, default=5.0, help="Delay between requests in seconds (per thread)")
+    parser.add_argument("--delay", type=float, default=5.0, help="Delay between requests in seconds (per city)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum in-flight page requests per city")
     parser.add_argument("--max-pages", type=int, help="Maximum pages to scrape per city")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet", help="Output file format for new listings (csv is written gzip-compressed)")
     args = parser.parse_args()
     output_directory = Path("results") / "imovelweb"
-    threads = []
+    jobs = []
     for city_slug_item in args.city:
         city_code = CITY_CODES.get(city_slug_item)
         if not city_code:
             print(f"!!! WARNING: City slug '{city_slug_item}' is not defined in CITY_CODES dictionary. Skipping this city.")
             continue
-        thread = threading.Thread(target=scrape_city_task, args=(city_slug_item, city_code, output_directory, args))
-        threads.append(thread)
-        thread.start()
-        time.sleep(2)
-    for thread in threads:
-        thread.join()
-    print("\nAll scraping threads have completed. Scraping session finished.")
+        jobs.append((city_slug_item, city_code))
+    if jobs:
+        seen_ids_by_city = load_seen_ids_for_cities(output_directory, tuple(city_slug_item for city_slug_item, _ in jobs))
+        with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = [executor.submit(run_city_process, city_slug_item, city_code, seen_ids_by_city[city_slug_item], output_directory, args, 2 * i)
+                       for i, (city_slug_item, city_code) in enumerate(jobs)]
+            for future in futures:
+                future.result()
+    print("\nAll scraping processes have completed. Scraping session finished.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
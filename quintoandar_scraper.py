@@ -1,8 +1,18 @@
 import requests
-import json
+import orjson
 import csv
 import sys
 import os
+import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+except ImportError:
+    pacsv = None
+
 
 def load_existing_ids(filepath):
     """
@@ -11,6 +21,16 @@ def load_existing_ids(filepath):
     if not os.path.exists(filepath):
         return set()
     
+    if pacsv is not None:
+        try:
+            # Descriptions can span several lines, so quoted newlines must be allowed.
+            tbl = pacsv.read_csv(filepath,
+                                 parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                                 convert_options=pacsv.ConvertOptions(include_columns=['id'], column_types={'id': pa.string()}))
+            return set(tbl.column('id').to_pylist())
+        except Exception as e:
+            print(f"Warning: Fast read of {filepath} failed, falling back to csv.DictReader. Error: {e}")
+
     existing_ids = set()
     try:
         with open(filepath, 'r', newline='', encoding='utf-8') as csvfile:
@@ -24,12 +44,21 @@ def load_existing_ids(filepath):
         
     return existing_ids
 
-def fetch_quintoandar_data(city_slug, total_size):
+def create_session():
+    """
+    Creates a requests session that keeps connections alive across cities and retries transient failures.
+    """
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504], allowed_methods=frozenset(["GET", "POST"]))
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry))
+    return session
+
+def fetch_quintoandar_data(city_slug, total_size, session=None):
     """
     Fetches a specified number of property listings in a single API request.
     """
     url = "https://apigw.prod.quintoandar.com.br/house-listing-search/v2/search/list"
-    headers = {'Content-Type': 'application/json'}
+    headers = {'Content-Type': 'application/json', 'Accept-Encoding': requests.utils.DEFAULT_ACCEPT_ENCODING}
 
     fields_to_request = [
         "id", "coverImage", "rent", "totalCost", "salePrice",
@@ -52,9 +81,9 @@ def fetch_quintoandar_data(city_slug, total_size):
 
     try:
         print(f"Making a single request to fetch up to {total_size} listings...")
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        response = (session or requests).post(url, headers=headers, data=orjson.dumps(payload))
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         
         if data.get("hits", {}).get("hits"):
             listings = [hit["_source"] for hit in data["hits"]["hits"]]
@@ -65,13 +94,14 @@ def fetch_quintoandar_data(city_slug, total_size):
     except requests.exceptions.RequestException as e:
         print(f"\nAn error occurred with the request for {city_slug}: {e}")
         return None, None
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print(f"\nFailed to decode the response as JSON for {city_slug}.")
         return None, None
 
-def save_to_csv(data, headers, filepath):
+def save_to_csv(data, headers, filepath, safe_csv=False):
     """
     Appends new data to a CSV file. Creates the file and writes headers if it doesn't exist.
+    Rows are written in a single pandas to_csv call; pass safe_csv=True to use csv.DictWriter instead.
     """
     if not data or not headers:
         print("No new data to save.")
@@ -79,26 +109,36 @@ def save_to_csv(data, headers, filepath):
 
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
     file_exists = os.path.exists(filepath)
-    
-    with open(filepath, 'a', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=headers, extrasaction='ignore')
-        
-        if not file_exists:
-            writer.writeheader()
-            
-        writer.writerows(data)
-    
+
+    if safe_csv:
+        with open(filepath, 'a', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=headers, extrasaction='ignore')
+
+            if not file_exists:
+                writer.writeheader()
+
+            writer.writerows(data)
+    else:
+        # dtype=object keeps values as the API returned them (no int -> float upcasting), and
+        # reindex drops unknown keys like extrasaction='ignore'. \r\n matches DictWriter so appends stay consistent.
+        df = pd.DataFrame(data, dtype=object).reindex(columns=headers)
+        df.to_csv(filepath, mode='a', header=not file_exists, index=False, encoding='utf-8', lineterminator='\r\n')
+
     print(f"Successfully saved/appended {len(data)} new listings to {filepath}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python quintoandar_scraper.py <page_multiplier> <city_slug_1> <city_slug_2> ...")
+    safe_csv = '--safe-csv' in sys.argv
+    argv = [arg for arg in sys.argv if arg != '--safe-csv']
+
+    if len(argv) < 3:
+        print("Usage: python quintoandar_scraper.py [--safe-csv] <page_multiplier> <city_slug_1> <city_slug_2> ...")
         print("\nExample: python quintoandar_scraper.py 5 sao-paulo-sp-brasil rio-de-janeiro-rj-brasil")
         print("This will request 500 listings for São Paulo and 500 for Rio de Janeiro.")
+        print("Pass --safe-csv to write rows with csv.DictWriter (for fields with unusual control characters).")
         sys.exit(1)
 
     try:
-        page_multiplier = int(sys.argv[1])
+        page_multiplier = int(argv[1])
         if page_multiplier < 1:
             print("Error: The page_multiplier must be at least 1.")
             sys.exit(1)
@@ -106,14 +146,15 @@ if __name__ == "__main__":
         print("Error: The first argument (page_multiplier) must be an integer.")
         sys.exit(1)
 
-    city_slugs = sys.argv[2:]
+    city_slugs = argv[2:]
     output_dir = "results/quintoandar"
     BASE_PAGE_SIZE = 1
     total_to_fetch = page_multiplier * BASE_PAGE_SIZE
 
     print(f"Starting scraper for {len(city_slugs)} cities.")
     print(f"Requesting up to {total_to_fetch} listings per city.")
-    
+
+    session = create_session()
     for city_slug in city_slugs:
         print(f"\n{'='*20} Processing city: {city_slug} {'='*20}")
         
@@ -125,19 +166,22 @@ if __name__ == "__main__":
         existing_ids = load_existing_ids(output_filepath)
         print(f"Found {len(existing_ids)} existing listings in {output_filepath}")
 
-        listings, fields = fetch_quintoandar_data(city_slug, total_to_fetch)
+        listings, fields = fetch_quintoandar_data(city_slug, total_to_fetch, session=session)
 
         if listings:
-            unique_new_listings = {str(item['id']): item for item in listings}.values()
-            final_listings_to_add = [
-                listing for listing in unique_new_listings 
-                if str(listing['id']) not in existing_ids
-            ]
+            seen_local = set()
+            final_listings_to_add = []
+            for item in listings:
+                sid = str(item['id'])
+                if sid in existing_ids or sid in seen_local:
+                    continue
+                seen_local.add(sid)
+                final_listings_to_add.append(item)
             
             print(f"Fetched {len(listings)} listings from the API.")
             print(f"Found {len(final_listings_to_add)} new, unique listings to add for {city_slug}.")
             
-            save_to_csv(final_listings_to_add, fields, output_filepath)
+            save_to_csv(final_listings_to_add, fields, output_filepath, safe_csv=safe_csv)
         else:
             print(f"No new listings found or an error occurred for {city_slug}.")
 